@@ -7,21 +7,29 @@ the main search running on the login node, generating successors and dispatching
 and waiting for jobs. 
 """
 
+from collections import OrderedDict
 from importlib import resources
 import logging
+import multiprocessing
 import os
 from pathlib import Path
 import pprint
+import queue
 import re
+import runpy
 import subprocess
+import sys
+import threading
 import time
+import traceback
+from typing import Iterator
 
 from machetli import tools, templates
 from machetli.errors import SubmissionError, PollingError, \
     format_called_process_error
 from machetli.evaluator import EXIT_CODE_BEHAVIOR_PRESENT, \
     EXIT_CODE_BEHAVIOR_NOT_PRESENT, EXIT_CODE_RESOURCE_LIMIT
-from machetli.tools import write_state, run
+from machetli.tools import run
 
 
 class EvaluationTask():
@@ -116,6 +124,15 @@ class Environment:
         successors from the next batch. Each batch is written to disk in one
         directory, with one subdirectory for each successor.
 
+    :param adaptive_batch_size:
+        If True, the number of successors submitted per batch is adapted to
+        the observed rate of improving successors: early in the search,
+        where the first few successors usually improve, small batches avoid
+        starting evaluations that are canceled right away; close to the
+        minimum, where almost no successor improves, batches grow back to
+        *batch_size* to keep the environment busy. *batch_size* then acts
+        as an upper bound. By default, the batch size is fixed.
+
     :param loglevel:
         Amount of logging output to generate. Use constants from the module
         :mod:`logging` to control the level of detail in the logs.
@@ -136,7 +153,18 @@ class Environment:
     login and compute nodes.
     """
 
-    def __init__(self, batch_size=1, loglevel=logging.INFO, exp_name: str | None = None):
+    EVAL_CACHE_SIZE = 4096
+    """
+    Maximal number of evaluation results remembered for duplicate states.
+    Successor generators can emit states that are structurally identical to
+    states evaluated earlier in the search. The environment caches the
+    results of completed evaluations (keyed by a fingerprint of the state)
+    so such duplicates do not have to be evaluated again. The least
+    recently used entries are dropped once this limit is reached.
+    """
+
+    def __init__(self, batch_size=1, adaptive_batch_size=False,
+                 loglevel=logging.INFO, exp_name: str | None = None):
         # TODO: this is accidentally doing what we want: in interactive python sessions
         # we don't have a script path and want to use the name of the current working directory
         # as the experiment name. This is what get_script_path returns, but this is coincidental.
@@ -149,7 +177,10 @@ class Environment:
         self.iteration_id = 0
         self.batch_id = 0
         self.batch_size = batch_size
+        self.adaptive_batch_size = adaptive_batch_size
+        self._hit_rate_ewma = 0.5
         self.loglevel = loglevel
+        self._eval_cache = OrderedDict()
 
     def start_new_iteration(self):
         """
@@ -180,19 +211,75 @@ class Environment:
                 raise SubmissionError(
                     f"Could not create run_dir at '{run_dir}'. Do you have old "
                     f"experiment data at '{self.eval_dir}'?")
-            write_state(successor.state, run_dir/self.STATE_FILENAME)
+            (run_dir/self.STATE_FILENAME).write_bytes(successor.blob)
             tasks.append(EvaluationTask(successor, task_id, run_dir))
         return EvaluationJob(job_name, evaluator_path, batch_dir, tasks)
 
-    def _run_job(self, job, on_task_completed) -> list[EvaluationTask]:
+    def get_batch_size(self):
+        """
+        Return the batch size to use for the next iteration. Without
+        adaptive batch sizing this is simply *batch_size*; otherwise the
+        size is inversely proportional to the observed rate of improving
+        successors, bounded by 1 and *batch_size*.
+        """
+        if not self.adaptive_batch_size:
+            return self.batch_size
+        return max(1, min(self.batch_size,
+                          int(1.0 / max(self._hit_rate_ewma, 1e-3))))
+
+    def record_iteration_result(self, improving_successor_found):
+        """
+        Notifies the environment whether the iteration that just finished
+        found an improving successor. Used to adapt the batch size.
+        """
+        self._hit_rate_ewma = (0.7 * self._hit_rate_ewma +
+                               0.3 * (1.0 if improving_successor_found else 0.0))
+
+    def get_cached_status(self, fingerprint):
+        """
+        Return the cached evaluation status for a state with the given
+        *fingerprint*, or None if no result is cached (or *fingerprint* is
+        None because the state could not be fingerprinted).
+        """
+        if fingerprint is None:
+            return None
+        try:
+            status = self._eval_cache[fingerprint]
+        except KeyError:
+            return None
+        self._eval_cache.move_to_end(fingerprint)
+        return status
+
+    def cache_status(self, fingerprint, status):
+        """
+        Remember the evaluation result for a state with the given
+        *fingerprint*. Only completed evaluations are cached: running out
+        of resources or crashing is not a reproducible property of the
+        state, so such results are not reused.
+        """
+        if fingerprint is None or status not in (
+                EvaluationTask.DONE_AND_BEHAVIOR_PRESENT,
+                EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT):
+            return
+        self._eval_cache[fingerprint] = status
+        self._eval_cache.move_to_end(fingerprint)
+        if len(self._eval_cache) > self.EVAL_CACHE_SIZE:
+            self._eval_cache.popitem(last=False)
+
+    def _run_job(self, job, on_task_completed) -> Iterator[EvaluationTask]:
         raise NotImplementedError
 
-    def run(self, evaluator_path, batch, on_task_completed) -> list[EvaluationTask]:
+    def run(self, evaluator_path, batch, on_task_completed) -> Iterator[EvaluationTask]:
         """
         Evaluate the given successors with the given evaluator. The evaluator is
         run on all successors (possibly in parallel, depending on the
         environment). Every time an evaluation of a successor is completed, the
-        callback `on_task_completed` is called.
+        callback `on_task_completed` is called and the task is yielded, so
+        results arrive at the caller in completion order, before the rest of
+        the batch is finished. A caller that stops iterating (e.g., after
+        finding an improving successor) should cancel the remaining tasks
+        through the `on_task_completed` callback; tasks that were canceled
+        before they started are yielded with status `CANCELED`.
 
         :param evaluator_path: path to a script that is used to evaluate a
             successor. The user documentation contains more information on
@@ -211,28 +298,147 @@ class Environment:
             be evaluated any more.
         """
         job = self._prepare_job(evaluator_path, batch)
-        self._run_job(job, on_task_completed)
-        return job.tasks
+        yield from self._run_job(job, on_task_completed)
+
+
+def _evaluate_in_worker(evaluator_path, run_dir, state_filename):
+    """
+    Run the evaluator script at *evaluator_path* on the state in *run_dir*
+    inside a persistent worker process. The script is executed as if it
+    were launched in a fresh subprocess (own argv, working directory, and
+    stdout/stderr redirected to run.log and run.err, exit code captured),
+    but modules imported by earlier evaluations stay loaded, so repeated
+    evaluations do not pay the interpreter startup and import cost again.
+    """
+    old_cwd = os.getcwd()
+    os.chdir(run_dir)
+    saved_out, saved_err = os.dup(1), os.dup(2)
+    log_fd = os.open("run.log", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    err_fd = os.open("run.err", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(err_fd, 2)
+    old_argv = sys.argv
+    sys.argv = [str(evaluator_path), state_filename]
+    exit_code = 0
+    try:
+        runpy.run_path(str(evaluator_path), run_name="__main__")
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.argv = old_argv
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_out, 1)
+        os.dup2(saved_err, 2)
+        for fd in (saved_out, saved_err, log_fd, err_fd):
+            os.close(fd)
+        os.chdir(old_cwd)
+    return exit_code
 
 
 class LocalEnvironment(Environment):
     """
-    This environment evaluates all successors sequentially on the local machine.
+    This environment evaluates successors on the local machine.
+
+    :param processes:
+        If given, keep a pool of this many long-lived worker processes and
+        evaluate successors of a batch in parallel on them. The workers
+        execute the evaluator script in-process, so the Python interpreter
+        startup and the imports of the evaluator's dependencies are paid
+        once per worker instead of once per successor. With the default of
+        None, each successor is evaluated sequentially in a fresh
+        subprocess.
 
     See :class:`Environment` for inherited options.
     """
-    def __init__(self, **kwargs):
+    def __init__(self, processes=None, **kwargs):
         Environment.__init__(self, **kwargs)
+        self._processes = processes
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Forked workers inherit the parent's heap copy-on-write, so
+            # modules, the initial state, and parser caches that are
+            # already loaded at this point are shared with the workers
+            # without being pickled. The pool is created lazily so the
+            # fork happens after the search has loaded its input. Only
+            # paths are sent over the pipe per task; the workers read the
+            # state from the run directory.
+            try:
+                context = multiprocessing.get_context("fork")
+            except ValueError:
+                # Fall back to the platform default where fork is not
+                # available (e.g., Windows).
+                context = multiprocessing.get_context()
+            self._pool = context.Pool(self._processes)
+        return self._pool
 
     def _run_job(self, job, on_task_completed):
+        if self._processes is None:
+            yield from self._run_job_sequentially(job, on_task_completed)
+        else:
+            yield from self._run_job_in_pool(job, on_task_completed)
+
+    def _run_job_sequentially(self, job, on_task_completed):
         for task in job.tasks:
-            if task.status == EvaluationTask.CANCELED:
-                continue
-            self._run_task(job.evaluator_path, task)
-            ids_to_cancel = on_task_completed(task) or []
-            for i in ids_to_cancel:
-                if job.tasks[i].status == EvaluationTask.PENDING:
-                    job.tasks[i].status = EvaluationTask.CANCELED
+            if task.status != EvaluationTask.CANCELED:
+                self._run_task(job.evaluator_path, task)
+                ids_to_cancel = on_task_completed(task) or []
+                for i in ids_to_cancel:
+                    if job.tasks[i].status == EvaluationTask.PENDING:
+                        job.tasks[i].status = EvaluationTask.CANCELED
+            yield task
+
+    def _run_job_in_pool(self, job, on_task_completed):
+        pool = self._get_pool()
+        evaluator_path = job.evaluator_path.absolute()
+        submissions = queue.SimpleQueue()
+        completions = queue.SimpleQueue()
+
+        # Submission is decoupled from reaping results: a dedicated thread
+        # feeds the pool while this thread only consumes the completion
+        # stream. Tasks that are canceled before the submitter reaches
+        # them are never dispatched to a worker; tasks canceled after
+        # dispatch finish in the background and their result is discarded.
+        def submit():
+            while (task := submissions.get()) is not None:
+                if task.status == EvaluationTask.CANCELED:
+                    completions.put((task, None))
+                    continue
+                pool.apply_async(
+                    _evaluate_in_worker,
+                    (evaluator_path, task.run_dir, self.STATE_FILENAME),
+                    callback=lambda exit_code, task=task:
+                        completions.put((task, exit_code)),
+                    error_callback=lambda error, task=task:
+                        completions.put((task, error)))
+
+        for task in job.tasks:
+            submissions.put(task)
+        submissions.put(None)
+        threading.Thread(target=submit, daemon=True).start()
+
+        for _ in range(len(job.tasks)):
+            task, result = completions.get()
+            if task.status != EvaluationTask.CANCELED:
+                if isinstance(result, BaseException):
+                    task.status = EvaluationTask.CRITICAL
+                    task.error_msg = f"Evaluation failed in worker: {result}"
+                else:
+                    _update_completed_task_status(task, result)
+                ids_to_cancel = on_task_completed(task) or []
+                for i in ids_to_cancel:
+                    if job.tasks[i].status == EvaluationTask.PENDING:
+                        job.tasks[i].status = EvaluationTask.CANCELED
+            yield task
 
     def _run_task(self, evaluator_path: Path, task):
         cmd = [str(evaluator_path.absolute()), self.STATE_FILENAME]
@@ -397,6 +603,7 @@ class SlurmEnvironment(Environment):
                         if ids_to_cancel:
                             self._cancel(job, ids_to_cancel)
                         pending_tasks_changed = True
+                        yield task
             if pending_task_ids:
                 logging.info(
                     f"{len(pending_task_ids)} task"
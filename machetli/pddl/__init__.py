@@ -23,11 +23,12 @@ The successor generators described below denote possible transformations.
 """
 
 from machetli.pddl.files import generate_initial_state, temporary_files, \
-    write_files, run_evaluator
+    write_files, run_evaluator, run_evaluator_inproc
 
 # We specify the imported functions and classes in __all__ so they will be
 # documented when the documentation of this package is generated.
-__all__ = ["generate_initial_state", "temporary_files", "write_files", "run_evaluator"]
+__all__ = ["generate_initial_state", "temporary_files", "write_files",
+           "run_evaluator", "run_evaluator_inproc"]
 
 
 def _import_successor_generators():
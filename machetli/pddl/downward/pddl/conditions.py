@@ -398,9 +398,21 @@ class Atom(Literal):
     def positive(self):
         return self
 
+    @property
+    def pddl_str(self):
+        """
+        PDDL representation of the atom (without indentation), cached on
+        first access. Atoms are immutable, so the cache never goes stale.
+        """
+        try:
+            return self._pddl_str
+        except AttributeError:
+            self._pddl_str = "(%s %s)\n" % (self.predicate,
+                                            " ".join(map(str, self.args)))
+            return self._pddl_str
+
     def dump_pddl(self, output, indent=""):
-        output.write("%s(%s %s)\n" % (indent, self.predicate,
-                                      " ".join(map(str, self.args))))
+        output.write(indent + self.pddl_str)
 
 
 class NegatedAtom(Literal):
@@ -422,8 +434,20 @@ class NegatedAtom(Literal):
     def negate(self):
         return Atom(self.predicate, self.args)
 
+    @property
+    def pddl_str(self):
+        """
+        PDDL representation of the negated atom (without indentation),
+        cached on first access.
+        """
+        try:
+            return self._pddl_str
+        except AttributeError:
+            self._pddl_str = "(not (%s %s))\n" % (self.predicate,
+                                                  " ".join(map(str, self.args)))
+            return self._pddl_str
+
     def dump_pddl(self, output, indent=""):
-        output.write("%s(not (%s %s))\n" % (indent, self.predicate,
-                                            " ".join(map(str, self.args))))
+        output.write(indent + self.pddl_str)
 
     positive = negate
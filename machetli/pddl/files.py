@@ -1,9 +1,13 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import io
 import logging
 import os
 from pickle import PickleError
 import sys
 import tempfile
+import threading
 
 from machetli.pddl.constants import KEY_IN_STATE
 from machetli.pddl.downward import pddl_parser
@@ -33,10 +37,16 @@ def _find_domain_filename(task_filename):
         "domain-" + basename,
     ]
 
+    # One directory read instead of one stat call per candidate name.
+    try:
+        with os.scandir(dirname or ".") as it:
+            existing_basenames = {entry.name for entry in it}
+    except FileNotFoundError:
+        existing_basenames = set()
+
     for domain_basename in domain_basenames:
-        domain_filename = os.path.join(dirname, domain_basename)
-        if os.path.exists(domain_filename):
-            return domain_filename
+        if domain_basename in existing_basenames:
+            return os.path.join(dirname, domain_basename)
 
     logging.critical(
         "Error: Could not find domain file using automatic naming rules.")
@@ -78,9 +88,28 @@ def temporary_files(state: dict) -> tuple:
     problem_file.close()
     write_files(state, domain_filename=domain_file.name,
                 problem_filename=problem_file.name)
-    yield domain_file.name, problem_file.name
-    os.remove(domain_file.name)
-    os.remove(problem_file.name)
+    try:
+        yield domain_file.name, problem_file.name
+    finally:
+        # The removal has to run in a finally block: evaluators exit the
+        # context via sys.exit, which kills the generator at the yield,
+        # and persistent worker processes would otherwise accumulate one
+        # file pair per evaluation.
+        # The files are uniquely named and no longer referenced, so their
+        # removal can overlap with whatever the caller does next. The
+        # thread must not be a daemon: in subprocess evaluators the
+        # interpreter shuts down right after this block and would kill a
+        # daemon thread mid-removal, while non-daemon threads are joined.
+        threading.Thread(target=_remove_files,
+                         args=(domain_file.name, problem_file.name)).start()
+
+
+def _remove_files(*filenames):
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
 
 
 def _run_evaluator_on_pddl_files(evaluate, domain_filename, task_filename):
@@ -154,174 +183,275 @@ def run_evaluator(evaluate):
         sys.exit(EXIT_CODE_CRITICAL)
 
 
-def _write_domain_header(task, file):
-    file.write("define (domain {})\n".format(task.domain_name))
+class _ListFile:
+    """
+    Minimal file-like object that appends everything written to it to a
+    list of string parts. It lets ``dump_pddl`` implementations that
+    expect a file keep working while the writers below collect their
+    output in memory and emit it with a single ``write`` call.
+    """
+    def __init__(self, parts):
+        self.write = parts.append
+
+
+def run_evaluator_inproc(evaluate):
+    """
+    Variant of :func:`run_evaluator` for evaluators that inspect the PDDL
+    content in-process instead of passing filenames to an external tool.
+    The state is serialized to two strings that are handed to *evaluate*
+    directly, so no temporary files are written and deleted per
+    evaluation.
+
+    :param evaluate: is a function taking the content of a PDDL domain and
+        problem file as two strings and returning ``True`` if the specified
+        behavior occurs for the given instance, and ``False`` if it
+        doesn't. Other ways of exiting the function (exceptions,
+        ``sys.exit`` with exit codes other than
+        :attr:`EXIT_CODE_BEHAVIOR_PRESENT<machetli.evaluator.EXIT_CODE_BEHAVIOR_PRESENT>` or
+        :attr:`EXIT_CODE_BEHAVIOR_NOT_PRESENT<machetli.evaluator.EXIT_CODE_BEHAVIOR_NOT_PRESENT>`)
+        are treated as failed evaluations by the search.
+    """
+    filenames = sys.argv[1:]
+    if len(filenames) == 1:
+        try:
+            state = tools.read_state(filenames[0])
+            domain_parts, problem_parts = _serialize_task(state[KEY_IN_STATE])
+            domain = "".join(domain_parts)
+            problem = "".join(problem_parts)
+        except (FileNotFoundError, PickleError):
+            task_filename = filenames[0]
+            domain_filename = _find_domain_filename(task_filename)
+            with open(domain_filename) as f:
+                domain = f.read()
+            with open(task_filename) as f:
+                problem = f.read()
+    elif len(filenames) == 2:
+        with open(filenames[0]) as f:
+            domain = f.read()
+        with open(filenames[1]) as f:
+            problem = f.read()
+    else:
+        logging.critical(
+            "Error: evaluator has to be called with either a path to a pickled "
+            "state, a task filename, or a domain filename followed by a task "
+            "filename.")
+        sys.exit(EXIT_CODE_CRITICAL)
+
+    if evaluate(domain, problem):
+        sys.exit(EXIT_CODE_BEHAVIOR_PRESENT)
+    else:
+        sys.exit(EXIT_CODE_BEHAVIOR_NOT_PRESENT)
+
+
+def _write_parts(parts, filename):
+    # PDDL output is plain ASCII, so an explicit large binary buffer with
+    # an ASCII text wrapper avoids both the default 8 KiB buffer and the
+    # per-character UTF-8 codec work for files of tens of megabytes.
+    with open(filename, "wb", buffering=1 << 20) as raw, \
+            io.TextIOWrapper(raw, encoding="ascii", newline="\n") as file:
+        file.write("".join(parts))
+
 
+def _write_domain_header(task, parts):
+    parts.append("define (domain {})\n".format(task.domain_name))
 
-def _write_domain_requirements(task, file):
+
+def _write_domain_requirements(task, parts):
     if len(task.requirements.requirements) != 0:
-        file.write(SIN + "(:requirements")
+        parts.append(SIN + "(:requirements")
         for req in task.requirements.requirements:
-            file.write(" " + req)
-        file.write(")\n")
+            parts.append(" " + req)
+        parts.append(")\n")
 
 
-def _write_domain_types(task, file):
+def _write_domain_types(task, parts):
     if task.types:
-        file.write(SIN + "(:types\n")
-        types_dict = {}
+        parts.append(SIN + "(:types\n")
+        types_dict = defaultdict(list)
         for tp in task.types:  # build dictionary of base types and types
             if tp.basetype_name is not None:
-                if tp.basetype_name not in types_dict:
-                    types_dict[tp.basetype_name] = [tp.name]
-                else:
-                    types_dict[tp.basetype_name].append(tp.name)
+                types_dict[tp.basetype_name].append(tp.name)
         for basetype in types_dict:
-            file.write(SIN + DIN)
+            parts.append(SIN + DIN)
             for name in types_dict[basetype]:
-                file.write(name + " ")
-            file.write("- " + basetype + "\n")
-        file.write(SIN + ")\n")
+                parts.append(name + " ")
+            parts.append("- " + basetype + "\n")
+        parts.append(SIN + ")\n")
 
 
-def _write_domain_objects(task, file):
+def _write_domain_objects(task, parts):
     if task.objects:  # all objects from planning task are going to be written into constants
-        file.write(SIN + "(:constants\n")
-        objects_dict = {}
+        parts.append(SIN + "(:constants\n")
+        objects_dict = defaultdict(list)
         for obj in task.objects:  # build dictionary of object type names and object names
-            if obj.type_name not in objects_dict:
-                objects_dict[obj.type_name] = [obj.name]
-            else:
-                objects_dict[obj.type_name].append(obj.name)
+            objects_dict[obj.type_name].append(obj.name)
         for type_name in objects_dict:
-            file.write(SIN + DIN)
+            parts.append(SIN + DIN)
             for name in objects_dict[type_name]:
-                file.write(name + " ")
-            file.write("- " + type_name + "\n")
-        file.write(SIN + ")\n")
+                parts.append(name + " ")
+            parts.append("- " + type_name + "\n")
+        parts.append(SIN + ")\n")
 
 
-def _write_domain_predicates(task, file):
+def _write_domain_predicates(task, parts):
     if len(task.predicates) != 0:
-        file.write(SIN + "(:predicates\n")
-        for pred in task.predicates:
-            if pred.name == "=":
+        append = parts.append
+        append(SIN + "(:predicates\n")
+        for pred_name, pred_arguments in ((p.name, p.arguments)
+                                          for p in task.predicates):
+            if pred_name == "=":
                 continue
-            types_dict = {}
-            for arg in pred.arguments:
-                if arg.type_name not in types_dict:
-                    types_dict[arg.type_name] = [arg.name]
-                else:
-                    types_dict[arg.type_name].append(arg.name)
-            file.write(SIN + SIN + "(" + pred.name)
+            types_dict = defaultdict(list)
+            for arg in pred_arguments:
+                types_dict[arg.type_name].append(arg.name)
+            append(SIN + SIN + "(" + pred_name)
             for obj in types_dict:
                 for name in types_dict[obj]:
-                    file.write(" " + name)
-                file.write(" - " + obj)
-            file.write(")\n")
-        file.write(SIN + ")\n")
+                    append(" " + name)
+                append(" - " + obj)
+            append(")\n")
+        append(SIN + ")\n")
 
 
-def _write_domain_functions(task, file):
+def _write_domain_functions(task, parts):
     if task.functions:
-        file.write(SIN + "(:functions\n")
+        parts.append(SIN + "(:functions\n")
+        file = _ListFile(parts)
         for function in task.functions:
             function.dump_pddl(file, DIN)
-        file.write(SIN + ")\n")
-
-
-def _write_domain_actions(task, file):
-    for action in task.actions:
-        file.write(SIN + "(:action {}\n".format(action.name))
-
-        file.write(DIN + ":parameters (")
-        if action.parameters:
-            for par in action.parameters:
-                file.write("%s - %s " % (par.name, par.type_name))
-        file.write(")\n")
-
-        file.write(SIN + SIN + ":precondition\n")
-        if not isinstance(action.precondition, Truth):
-            action.precondition.dump_pddl(file, DIN)
-        file.write(DIN + ":effect\n")
-        file.write(DIN + "(and\n")
-        for eff in action.effects:
+        parts.append(SIN + ")\n")
+
+
+def _write_domain_actions(task, parts):
+    file = _ListFile(parts)
+    append = parts.append
+    # Unpack each action once instead of looking up the attributes
+    # repeatedly inside the loop body.
+    for name, parameters, precondition, effects, cost in (
+            (a.name, a.parameters, a.precondition, a.effects, a.cost)
+            for a in task.actions):
+        append(SIN + "(:action {}\n".format(name))
+
+        append(DIN + ":parameters (")
+        if parameters:
+            for par in parameters:
+                append("%s - %s " % (par.name, par.type_name))
+        append(")\n")
+
+        append(SIN + SIN + ":precondition\n")
+        if type(precondition) is not Truth:
+            precondition.dump_pddl(file, DIN)
+        append(DIN + ":effect\n")
+        append(DIN + "(and\n")
+        for eff in effects:
             eff.dump_pddl(file, DIN)
-        if action.cost:
-            action.cost.dump_pddl(file, DIN + DIN)
-        file.write(DIN + ")\n")
+        if cost:
+            cost.dump_pddl(file, DIN + DIN)
+        append(DIN + ")\n")
 
-        file.write(SIN + ")\n")
+        append(SIN + ")\n")
 
 
-def _write_domain_axioms(task, file):
-    for axiom in task.axioms:
-        file.write(SIN + "(:derived ({} ".format(axiom.name))
-        for par in axiom.parameters:
-            file.write("%s - %s " % (par.name, par.type_name))
-        file.write(")\n")
-        axiom.condition.dump_pddl(file, DIN)
-        file.write(SIN + ")\n")
+def _write_domain_axioms(task, parts):
+    file = _ListFile(parts)
+    append = parts.append
+    for name, parameters, condition in ((a.name, a.parameters, a.condition)
+                                        for a in task.axioms):
+        append(SIN + "(:derived ({} ".format(name))
+        for par in parameters:
+            append("%s - %s " % (par.name, par.type_name))
+        append(")\n")
+        condition.dump_pddl(file, DIN)
+        append(SIN + ")\n")
 
 
-def _write_domain(task, filename):
-    with open(filename, "w") as file:
-        file.write("\n(")
-        _write_domain_header(task, file)
-        _write_domain_requirements(task, file)
-        _write_domain_types(task, file)
-        _write_domain_objects(task, file)
-        _write_domain_predicates(task, file)
-        _write_domain_functions(task, file)
-        _write_domain_axioms(task, file)
-        _write_domain_actions(task, file)
-        file.write(")\n")
+def _domain_parts(task):
+    parts = ["\n("]
+    _write_domain_header(task, parts)
+    _write_domain_requirements(task, parts)
+    _write_domain_types(task, parts)
+    _write_domain_objects(task, parts)
+    _write_domain_predicates(task, parts)
+    _write_domain_functions(task, parts)
+    _write_domain_axioms(task, parts)
+    _write_domain_actions(task, parts)
+    parts.append(")\n")
+    return parts
 
 
-def _write_problem_header(task, file):
-    file.write("define (problem {})\n".format(task.task_name))
+def _write_problem_header(task, parts):
+    parts.append("define (problem {})\n".format(task.task_name))
 
 
-def _write_problem_domain(task, file):
-    file.write(SIN + "(:domain {})\n".format(task.domain_name))
+def _write_problem_domain(task, parts):
+    parts.append(SIN + "(:domain {})\n".format(task.domain_name))
 
 
-def _write_problem_init(task, file):
-    file.write(SIN + "(:init\n")
+def _write_problem_init(task, parts):
+    parts.append(SIN + "(:init\n")
 
+    file = _ListFile(parts)
+    # Atom and Truth have no subclasses, so the exact type checks here and
+    # in _write_domain_actions replace the isinstance calls in these hot
+    # loops with cheaper C-level identity tests.
+    indent = SIN + DIN
     for elem in task.init:
-        if isinstance(elem, Atom) and elem.predicate == "=":
-            continue
-        elem.dump_pddl(file, SIN + DIN)
-    file.write(SIN + ")\n")
+        if type(elem) is Atom:
+            # Atoms dominate large init blocks; emit their cached
+            # representation directly instead of dispatching to dump_pddl.
+            if elem.predicate == "=":
+                continue
+            parts.append(indent)
+            parts.append(elem.pddl_str)
+        else:
+            elem.dump_pddl(file, indent)
+    parts.append(SIN + ")\n")
 
 
-def _write_problem_goal(task, file):
-    file.write(SIN + "(:goal\n")
+def _write_problem_goal(task, parts):
+    parts.append(SIN + "(:goal\n")
     if not isinstance(task.goal, ConstantCondition):
-        task.goal.dump_pddl(file, SIN + DIN)
-    file.write("%s)\n" % SIN)
+        task.goal.dump_pddl(_ListFile(parts), SIN + DIN)
+    parts.append("%s)\n" % SIN)
 
 
-def _write_problem_metric(task, file):
+def _write_problem_metric(task, parts):
     if task.use_min_cost_metric:
-        file.write("%s(:metric minimize (total-cost))\n" % SIN)
+        parts.append("%s(:metric minimize (total-cost))\n" % SIN)
+
+
+def _problem_parts(task):
+    parts = ["\n("]
+    _write_problem_header(task, parts)
+    _write_problem_domain(task, parts)
+    _write_problem_init(task, parts)
+    _write_problem_goal(task, parts)
+    _write_problem_metric(task, parts)
+    parts.append(")\n")
+    return parts
 
 
-def _write_problem(task, filename):
-    with open(filename, "w") as file:
-        file.write("\n(")
-        _write_problem_header(task, file)
-        _write_problem_domain(task, file)
-        _write_problem_init(task, file)
-        _write_problem_goal(task, file)
-        _write_problem_metric(task, file)
-        file.write(")\n")
+def _serialize_task(task):
+    """
+    Serialize *task* once, returning the domain and problem output as two
+    lists of string parts. The domain and problem files cover disjoint
+    sections of the task, so a single call produces both buffers without
+    traversing shared parts of the task twice.
+    """
+    return _domain_parts(task), _problem_parts(task)
 
 
 def write_files(state: dict, domain_filename: str, problem_filename: str):
     """
     Write the domain and problem files represented in `state` to disk.
     """
-    _write_domain(state[KEY_IN_STATE], domain_filename)
-    _write_problem(state[KEY_IN_STATE], problem_filename)
+    domain_parts, problem_parts = _serialize_task(state[KEY_IN_STATE])
+    # The two writes are independent and release the GIL during the write
+    # syscalls, so the I/O of one file overlaps with the other.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(_write_parts, domain_parts, domain_filename),
+            executor.submit(_write_parts, problem_parts, problem_filename),
+        ]
+        for future in futures:
+            future.result()
@@ -23,12 +23,12 @@ where ``result`` is the value returned by the
 The successor generators described below denote possible transformations.
 """
 from machetli.sas.files import generate_initial_state, temporary_file, \
-    write_file, run_evaluator
+    write_file, run_evaluator, run_evaluator_inproc
 
 # We specify the imported functions and classes in __all__ so they will be
 # documented when the documentation of this package is generated.
 __all__ = ["generate_initial_state", "temporary_file", "write_file",
-           "run_evaluator"]
+           "run_evaluator", "run_evaluator_inproc"]
 
 
 def _import_successor_generators():
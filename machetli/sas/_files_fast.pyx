@@ -0,0 +1,176 @@
+# cython: language_level=3
+"""
+Optional Cython implementation of the hot loops of the SAS :sup:`+` parser
+in :mod:`machetli.sas.files`. The module mirrors the pure-Python parser
+line by line but types the loop counters and containers, which removes
+most of the interpreter overhead of the per-token ``int()``/``split()``
+work. If the extension is not built, :mod:`machetli.sas.files` falls back
+to the pure-Python implementation at import time.
+"""
+
+from machetli.sas.sas_tasks import SASTask, SASVariables, SASMutexGroup, \
+    SASInit, SASGoal, SASOperator, SASAxiom
+
+
+def read_task(str path):
+    """
+    Parse the SAS :sup:`+` file at *path* and return the resulting
+    :class:`SASTask<machetli.sas.sas_tasks.SASTask>`. The task is *not*
+    validated; the caller is expected to do that.
+    """
+    cdef list lines
+    cdef Py_ssize_t i = 0
+    cdef int num_vars, num_mutexes, num_operators, num_axioms
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    while lines[i] != "begin_metric":
+        i += 1
+    i += 1
+    metric = bool(lines[i])
+    assert lines[i + 1] == "end_metric"
+    i += 2
+
+    num_vars = int(lines[i])
+    i += 1
+    variables, i = _read_variables(lines, i, num_vars)
+    num_mutexes = int(lines[i])
+    i += 1
+    mutexes, i = _read_mutexes(lines, i, num_mutexes)
+    init, i = _read_init_state(lines, i, num_vars)
+    goal, i = _read_goal(lines, i)
+    num_operators = int(lines[i])
+    i += 1
+    operators, i = _read_operators(lines, i, num_operators)
+    num_axioms = int(lines[i])
+    i += 1
+    axioms, i = _read_axioms(lines, i, num_axioms)
+
+    return SASTask(variables, mutexes, init, goal, operators, axioms, metric)
+
+
+cdef _read_variables(list lines, Py_ssize_t i, int num_vars):
+    cdef list axiom_layers = []
+    cdef list ranges = []
+    cdef list value_name_lists = []
+    cdef int num_values
+    cdef int _
+    for _ in range(num_vars):
+        assert lines[i] == "begin_variable"
+        i += 2  # skip variable name
+        axiom_layers.append(int(lines[i]))
+        num_values = int(lines[i + 1])
+        i += 2
+        ranges.append(num_values)
+        value_name_lists.append(lines[i:i + num_values])
+        i += num_values
+        assert lines[i] == "end_variable"
+        i += 1
+    return SASVariables(ranges, axiom_layers, value_name_lists), i
+
+
+cdef _read_mutexes(list lines, Py_ssize_t i, int num_mutexes):
+    cdef list mutexes = []
+    cdef list facts
+    cdef int num_facts, var, val
+    cdef int _, __
+    for _ in range(num_mutexes):
+        assert lines[i] == "begin_mutex_group"
+        num_facts = int(lines[i + 1])
+        i += 2
+        facts = []
+        for __ in range(num_facts):
+            var, val = [int(tok) for tok in (<str>lines[i]).split(" ")]
+            i += 1
+            facts.append((var, val))
+        mutexes.append(SASMutexGroup(facts))
+        assert lines[i] == "end_mutex_group"
+        i += 1
+    return mutexes, i
+
+
+cdef _read_init_state(list lines, Py_ssize_t i, int num_vars):
+    assert lines[i] == "begin_state"
+    i += 1
+    cdef list init = [int(val) for val in lines[i:i + num_vars]]
+    i += num_vars
+    assert lines[i] == "end_state"
+    return SASInit(init), i + 1
+
+
+cdef _read_goal(list lines, Py_ssize_t i):
+    assert lines[i] == "begin_goal"
+    cdef int num_pairs = int(lines[i + 1])
+    i += 2
+    cdef list pairs = []
+    cdef int var, val
+    cdef int _
+    for _ in range(num_pairs):
+        var, val = [int(tok) for tok in (<str>lines[i]).split(" ")]
+        i += 1
+        pairs.append((var, val))
+    assert lines[i] == "end_goal"
+    return SASGoal(pairs), i + 1
+
+
+cdef _read_operators(list lines, Py_ssize_t i, int num_operators):
+    cdef list operators = []
+    cdef list prevail_conditions, pre_post, cond, effect_line
+    cdef int num_prevail_conditions, num_effects, num_effect_conditions
+    cdef int var, val, pre, post, cost, cond_num
+    cdef int _, __
+    for _ in range(num_operators):
+        assert lines[i] == "begin_operator"
+        name = "(" + <str>lines[i + 1] + ")"
+        num_prevail_conditions = int(lines[i + 2])
+        i += 3
+        prevail_conditions = []
+        for __ in range(num_prevail_conditions):
+            var, val = [int(tok) for tok in (<str>lines[i]).split(" ")]
+            i += 1
+            prevail_conditions.append((var, val))
+        num_effects = int(lines[i])
+        i += 1
+        pre_post = []
+        for __ in range(num_effects):
+            effect_line = [int(tok) for tok in (<str>lines[i]).split(" ")]
+            i += 1
+            num_effect_conditions = effect_line[0]
+            cond = []
+            for cond_num in range(1, 2 * num_effect_conditions, 2):
+                cond.append((effect_line[cond_num], effect_line[cond_num + 1]))
+            var = effect_line[len(effect_line) - 3]
+            pre = effect_line[len(effect_line) - 2]
+            post = effect_line[len(effect_line) - 1]
+            pre_post.append((var, pre, post, cond))
+        cost = int(lines[i])
+        operators.append(SASOperator(name, prevail_conditions, pre_post, cost))
+        assert lines[i + 1] == "end_operator"
+        i += 2
+    return operators, i
+
+
+cdef _read_axioms(list lines, Py_ssize_t i, int num_axioms):
+    cdef list axioms = []
+    cdef list condition, effect_line
+    cdef int length_body, var, val
+    cdef int _, __
+    for _ in range(num_axioms):
+        assert lines[i] == "begin_rule"
+        length_body = int(lines[i + 1])
+        i += 2
+        condition = []
+        for __ in range(length_body):
+            var, val = [int(tok) for tok in (<str>lines[i]).split(" ")]
+            i += 1
+            condition.append((var, val))
+        effect_line = [int(tok) for tok in (<str>lines[i]).split(" ")]
+        i += 1
+        var = effect_line[0]
+        val = effect_line[2]
+        assert 1 - val == effect_line[1]
+        axioms.append(SASAxiom(condition, (var, val)))
+        assert lines[i] == "end_rule"
+        i += 1
+    return axioms, i
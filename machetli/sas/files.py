@@ -1,4 +1,5 @@
 import copy
+import functools
 import tempfile
 import contextlib
 import logging
@@ -6,15 +7,24 @@ import os
 from pathlib import Path
 from pickle import PickleError
 import sys
+import threading
 
 from machetli.sas.constants import KEY_IN_STATE
-from machetli.sas.sas_tasks import SASTask, SASVariables, SASMutexGroup, \
-    SASInit, SASGoal, SASOperator, SASAxiom
+from machetli.sas.sas_tasks import SAS_FILE_VERSION, SASTask, SASVariables, \
+    SASMutexGroup, SASInit, SASGoal, SASOperator, SASAxiom
 
 from machetli import tools
 from machetli.evaluator import EXIT_CODE_CRITICAL, EXIT_CODE_BEHAVIOR_PRESENT, \
     EXIT_CODE_BEHAVIOR_NOT_PRESENT
-from typing import Any, Iterator, List, Generator
+from typing import Any, List, Generator
+
+try:
+    # Optional Cython implementation of the parser hot loops. The
+    # extension is not built in a default installation; without it we
+    # fall back to the pure-Python parser below.
+    from machetli.sas._files_fast import read_task as _read_task_fast
+except ImportError:
+    _read_task_fast = None
 
 
 def  generate_initial_state(sas_file: str) -> dict[str, SASTask]:
@@ -45,13 +55,47 @@ def temporary_file(state: dict) -> Generator[str, Any, None]:
         with temporary_file(state) as sas_filename:
             cmd = ["fast-downward.py", f"{sas_filename}", "--search", "astar(lmcut())"]
 
+    On Linux, the file is backed by an anonymous in-memory file
+    (``memfd_create``) and never touches the disk; it is exposed through a
+    ``/proc/<pid>/fd/<fd>`` path that child processes can open like a
+    regular file. On other platforms a named temporary file is used.
+
     :return: the filename.
     """
-    f = tempfile.NamedTemporaryFile(mode="w+t", suffix=".sas", delete=False)
-    state[KEY_IN_STATE].output(f)
-    f.close()
-    yield f.name
-    os.remove(f.name)
+    # The cleanup has to run in a finally block: evaluators exit the
+    # context via sys.exit, which kills the generator at the yield, and
+    # in persistent worker processes a leaked memfd would pin the
+    # serialized task in memory for the lifetime of the worker.
+    if hasattr(os, "memfd_create"):
+        fd = os.memfd_create("machetli-task.sas", os.MFD_CLOEXEC)
+        try:
+            # closefd=False keeps the memfd (and with it the content) alive
+            # after the writing file object is closed.
+            with open(fd, "w", closefd=False) as f:
+                f.write(_fast_output(state[KEY_IN_STATE]))
+            yield f"/proc/{os.getpid()}/fd/{fd}"
+        finally:
+            os.close(fd)
+    else:
+        f = tempfile.NamedTemporaryFile(mode="w+t", suffix=".sas", delete=False)
+        f.write(_fast_output(state[KEY_IN_STATE]))
+        f.close()
+        try:
+            yield f.name
+        finally:
+            # The file is uniquely named and no longer referenced, so its
+            # removal can overlap with whatever the caller does next. The
+            # thread must not be a daemon: in subprocess evaluators the
+            # interpreter shuts down right after this block and would kill
+            # a daemon thread mid-removal.
+            threading.Thread(target=_remove_file, args=(f.name,)).start()
+
+
+def _remove_file(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
 
 
 def _run_evaluator_on_sas_file(evaluate, sas_filename):
@@ -99,103 +143,183 @@ def run_evaluator(evaluate):
         sys.exit(EXIT_CODE_CRITICAL)
 
 
+def run_evaluator_inproc(evaluate):
+    r"""
+    Variant of :func:`run_evaluator` for evaluators that inspect the
+    SAS :sup:`+` content in-process instead of passing a filename to an
+    external tool. The state is serialized to a string and handed to
+    *evaluate* directly, so no temporary file is written and deleted per
+    evaluation.
+
+    :param evaluate: is a function taking the content of a SAS :sup:`+`
+        file as a string and returning ``True`` if the specified behavior
+        occurs for the given instance, and ``False`` if it doesn't. Other
+        ways of exiting the function (exceptions, ``sys.exit`` with exit
+        codes other than
+        :attr:`EXIT_CODE_BEHAVIOR_PRESENT<machetli.evaluator.EXIT_CODE_BEHAVIOR_PRESENT>` or
+        :attr:`EXIT_CODE_BEHAVIOR_NOT_PRESENT<machetli.evaluator.EXIT_CODE_BEHAVIOR_NOT_PRESENT>`)
+        are treated as failed evaluations by the search.
+    """
+    if len(sys.argv) == 2:
+        filename = sys.argv[1]
+        try:
+            state = tools.read_state(filename)
+            content = _fast_output(state[KEY_IN_STATE])
+        except (FileNotFoundError, PickleError):
+            content = Path(filename).read_text()
+        if evaluate(content):
+            sys.exit(EXIT_CODE_BEHAVIOR_PRESENT)
+        else:
+            sys.exit(EXIT_CODE_BEHAVIOR_NOT_PRESENT)
+    else:
+        logging.critical(
+            "Error: evaluator has to be called with either a path to a pickled "
+            "state, or a path to a SAS^+ file.")
+        sys.exit(EXIT_CODE_CRITICAL)
+
+
 def _read_task(sas_file : Path) -> SASTask:
-    lines = (l for l in sas_file.read_text().splitlines())
-    while True:
-        line = next(lines)
-        if line == "begin_metric":
-            break
-    metric = bool(next(lines))
-    assert next(lines) == "end_metric"
+    """
+    Parse *sas_file* and return the resulting task. Results are cached per
+    file (keyed on path, modification time, and size), so repeated reads of
+    an unchanged file within the same process skip parsing. Callers must
+    treat the returned task as immutable; to modify it, work on a copy
+    (e.g., ``copy.deepcopy`` or :func:`renamed_sas`).
+    """
+    file_stat = sas_file.stat()
+    return _read_task_cached(str(sas_file), file_stat.st_mtime_ns,
+                             file_stat.st_size)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_task_cached(path: str, mtime_ns: int, size: int) -> SASTask:
+    sas_file = Path(path)
+    if _read_task_fast is not None:
+        sas_task = _read_task_fast(str(sas_file))
+        sas_task.validate()
+        return sas_task
+
+    lines = sas_file.read_text().splitlines()
+    # The cursor is a single-element list so the _read_* helpers can all
+    # advance the same position in *lines*. Indexing into the list avoids
+    # the per-line generator overhead of the previous implementation.
+    cur = [0]
+
+    def nxt():
+        line = lines[cur[0]]
+        cur[0] += 1
+        return line
+
+    while nxt() != "begin_metric":
+        pass
+    metric = bool(nxt())
+    assert nxt() == "end_metric"
     # read variables
-    num_vars = int(next(lines))
-    variables = _read_variables(lines, num_vars)
+    num_vars = int(nxt())
+    variables = _read_variables(lines, cur, num_vars)
     # read mutexes
-    num_mutexes = int(next(lines))
-    mutexes = _read_mutexes(lines, num_mutexes)
+    num_mutexes = int(nxt())
+    mutexes = _read_mutexes(lines, cur, num_mutexes)
     # read init state
-    init = _read_init_state(lines, num_vars)
+    init = _read_init_state(lines, cur, num_vars)
     # read goal
-    goal = _read_goal(lines)
+    goal = _read_goal(lines, cur)
     # read operators
-    num_operators = int(next(lines))
-    operators = _read_operators(lines, num_operators)
+    num_operators = int(nxt())
+    operators = _read_operators(lines, cur, num_operators)
     # read axioms
-    num_axioms = int(next(lines))
-    axioms = _read_axioms(lines, num_axioms)
+    num_axioms = int(nxt())
+    axioms = _read_axioms(lines, cur, num_axioms)
 
     sas_task = SASTask(variables, mutexes, init, goal, operators, axioms, metric)
     sas_task.validate()
     return sas_task
 
 
-def _read_variables(lines: Iterator[Any], num_vars: int) -> SASVariables:
+def _read_variables(lines: List[str], cur: List[int], num_vars: int) -> SASVariables:
     axiom_layers = []
     ranges = []
     value_name_lists = []
+    i = cur[0]
     for _ in range(num_vars):
-        assert next(lines) == "begin_variable"
-        next(lines)  # skip variable name
-        axiom_layers.append(int(next(lines)))
-        num_values = int(next(lines))
+        assert lines[i] == "begin_variable"
+        i += 2  # skip variable name
+        axiom_layers.append(int(lines[i]))
+        num_values = int(lines[i + 1])
+        i += 2
         ranges.append(num_values)
-        value_names = []
-        for _ in range(num_values):
-            value_names.append(next(lines))
-        value_name_lists.append(value_names)
-        assert next(lines) == "end_variable"
+        value_name_lists.append(lines[i:i + num_values])
+        i += num_values
+        assert lines[i] == "end_variable"
+        i += 1
+    cur[0] = i
     return SASVariables(ranges, axiom_layers, value_name_lists)
 
 
-def _read_mutexes(lines: Iterator[Any], num_mutexes: int) -> List[Any]:
+def _read_mutexes(lines: List[str], cur: List[int], num_mutexes: int) -> List[Any]:
     mutexes = []
+    i = cur[0]
     for _ in range(num_mutexes):
-        assert next(lines) == "begin_mutex_group"
-        num_facts = int(next(lines))
+        assert lines[i] == "begin_mutex_group"
+        num_facts = int(lines[i + 1])
+        i += 2
         facts = []
         for _ in range(num_facts):
-            var, val = map(int, next(lines).split(" "))
-            facts.append((var, val))
+            var, val = lines[i].split(" ")
+            i += 1
+            facts.append((int(var), int(val)))
         mutexes.append(SASMutexGroup(facts))
-        assert next(lines) == "end_mutex_group"
+        assert lines[i] == "end_mutex_group"
+        i += 1
+    cur[0] = i
     return mutexes
 
 
-def _read_init_state(lines: Iterator[Any], num_vars: int) -> SASInit:
-    init = []
-    assert next(lines) == "begin_state"
-    for _ in range(num_vars):
-        val = int(next(lines))
-        init.append(val)
-    assert next(lines) == "end_state"
+def _read_init_state(lines: List[str], cur: List[int], num_vars: int) -> SASInit:
+    i = cur[0]
+    assert lines[i] == "begin_state"
+    i += 1
+    init = [int(val) for val in lines[i:i + num_vars]]
+    i += num_vars
+    assert lines[i] == "end_state"
+    cur[0] = i + 1
     return SASInit(init)
 
 
-def _read_goal(lines: Iterator[Any]) -> SASGoal:
-    assert next(lines) == "begin_goal"
-    num_pairs = int(next(lines))
+def _read_goal(lines: List[str], cur: List[int]) -> SASGoal:
+    i = cur[0]
+    assert lines[i] == "begin_goal"
+    num_pairs = int(lines[i + 1])
+    i += 2
     pairs = []
     for _ in range(num_pairs):
-        var, val = map(int, next(lines).split(" "))
-        pairs.append((var, val))
-    assert next(lines) == "end_goal"
+        var, val = lines[i].split(" ")
+        i += 1
+        pairs.append((int(var), int(val)))
+    assert lines[i] == "end_goal"
+    cur[0] = i + 1
     return SASGoal(pairs)
 
 
-def _read_operators(lines: Iterator[Any], num_operators: int) -> List[SASOperator]:
+def _read_operators(lines: List[str], cur: List[int], num_operators: int) -> List[SASOperator]:
     operators = []
+    i = cur[0]
     for _ in range(num_operators):
-        assert next(lines) == "begin_operator"
-        name = "(" + next(lines) + ")"
-        num_prevail_conditions = int(next(lines))
+        assert lines[i] == "begin_operator"
+        name = "(" + lines[i + 1] + ")"
+        num_prevail_conditions = int(lines[i + 2])
+        i += 3
         prevail_conditions = []
         for _ in range(num_prevail_conditions):
-            var, val = map(int, next(lines).split(" "))
-            prevail_conditions.append((var, val))
-        num_effects = int(next(lines))
+            var, val = lines[i].split(" ")
+            i += 1
+            prevail_conditions.append((int(var), int(val)))
+        num_effects = int(lines[i])
+        i += 1
         pre_post = []
         for _ in range(num_effects):
-            effect_line = list(map(int, next(lines).split(" ")))
+            effect_line = list(map(int, lines[i].split(" ")))
+            i += 1
             num_effect_conditions = effect_line[0]
             cond = []
             for cond_num in range(1, 2 * num_effect_conditions, 2):
@@ -204,37 +328,150 @@ def _read_operators(lines: Iterator[Any], num_operators: int) -> List[SASOperato
                 cond.append((var, val))
             var, pre, post = effect_line[-3:]
             pre_post.append((var, pre, post, cond))
-        cost = int(next(lines))
+        cost = int(lines[i])
         operators.append(SASOperator(name, prevail_conditions, pre_post, cost))
-        assert next(lines) == "end_operator"
+        assert lines[i + 1] == "end_operator"
+        i += 2
+    cur[0] = i
     return operators
 
 
-def _read_axioms(lines: Iterator[Any], num_axioms: int) -> List[Any]:
+def _read_axioms(lines: List[str], cur: List[int], num_axioms: int) -> List[Any]:
     axioms = []
+    i = cur[0]
     for _ in range(num_axioms):
-        assert next(lines) == "begin_rule"
-        length_body = int(next(lines))
+        assert lines[i] == "begin_rule"
+        length_body = int(lines[i + 1])
+        i += 2
         condition = []
         for _ in range(length_body):
-            var, val = map(int, next(lines).split(" "))
-            condition.append((var, val))
-        effect_line = list(map(int, next(lines).split(" ")))
+            var, val = lines[i].split(" ")
+            i += 1
+            condition.append((int(var), int(val)))
+        effect_line = list(map(int, lines[i].split(" ")))
+        i += 1
         var = effect_line[0]
         val = effect_line[2]
         assert 1 - val == effect_line[1]
         effect = (var, val)
         axioms.append(SASAxiom(condition, effect))
-        assert next(lines) == "end_rule"
+        assert lines[i] == "end_rule"
+        i += 1
+    cur[0] = i
     return axioms
 
 
+def _task_to_lists(task: SASTask) -> list:
+    return [
+        [task.variables.ranges, task.variables.axiom_layers,
+         task.variables.value_names],
+        [mutex.facts for mutex in task.mutexes],
+        task.init.values,
+        task.goal.pairs,
+        [[op.name, op.prevail, op.pre_post, op.cost]
+         for op in task.operators],
+        [[axiom.condition, axiom.effect] for axiom in task.axioms],
+        task.metric,
+    ]
+
+
+def _task_from_lists(data: list) -> SASTask:
+    # msgpack turns tuples into lists, so all facts have to be converted
+    # back into the (var, val) tuples the rest of the code expects.
+    variables_data, mutexes, init_values, goal_pairs, operators, axioms, \
+        metric = data
+    ranges, axiom_layers, value_names = variables_data
+    variables = SASVariables(ranges, axiom_layers, value_names)
+    mutex_groups = [SASMutexGroup([tuple(fact) for fact in facts])
+                    for facts in mutexes]
+    init = SASInit(init_values)
+    goal = SASGoal([tuple(pair) for pair in goal_pairs])
+    new_operators = [
+        SASOperator(name, [tuple(fact) for fact in prevail],
+                    [(var, pre, post, [tuple(fact) for fact in cond])
+                     for var, pre, post, cond in pre_post], cost)
+        for name, prevail, pre_post, cost in operators]
+    new_axioms = [SASAxiom([tuple(fact) for fact in condition], tuple(effect))
+                  for condition, effect in axioms]
+    return SASTask(variables, mutex_groups, init, goal, new_operators,
+                   new_axioms, metric)
+
+
+tools.register_msgpack_type("sas_task", SASTask, _task_to_lists,
+                            _task_from_lists)
+
+
+def _fast_output(task: SASTask) -> str:
+    """
+    Serialize *task* into a single string. This produces exactly the same
+    text as ``SASTask.output`` but builds the whole file in memory instead
+    of printing token by token, so the result can be written with one
+    ``write`` call.
+    """
+    parts = ["begin_version\n%d\nend_version\nbegin_metric\n%d\nend_metric\n"
+             % (SAS_FILE_VERSION, int(task.metric))]
+    append = parts.append
+    variables = task.variables
+    append("%d\n" % len(variables.ranges))
+    for var, (rang, axiom_layer, values) in enumerate(zip(
+            variables.ranges, variables.axiom_layers, variables.value_names)):
+        assert rang == len(values), (rang, values)
+        append("begin_variable\nvar%d\n%d\n%d\n" % (var, axiom_layer, rang))
+        append("\n".join(values))
+        append("\nend_variable\n")
+    append("%d\n" % len(task.mutexes))
+    for mutex in task.mutexes:
+        append("begin_mutex_group\n%d\n" % len(mutex.facts))
+        for var, val in mutex.facts:
+            append("%d %d\n" % (var, val))
+        append("end_mutex_group\n")
+    append("begin_state\n")
+    append("".join("%d\n" % val for val in task.init.values))
+    append("end_state\nbegin_goal\n%d\n" % len(task.goal.pairs))
+    for var, val in task.goal.pairs:
+        append("%d %d\n" % (var, val))
+    append("end_goal\n%d\n" % len(task.operators))
+    for op in task.operators:
+        append("begin_operator\n%s\n%d\n" % (op.name[1:-1], len(op.prevail)))
+        for var, val in op.prevail:
+            append("%d %d\n" % (var, val))
+        append("%d\n" % len(op.pre_post))
+        for var, pre, post, cond in op.pre_post:
+            if cond:
+                append("%d %s %d %d %d\n"
+                       % (len(cond), " ".join("%d %d" % tuple(c) for c in cond),
+                          var, pre, post))
+            else:
+                append("0 %d %d %d\n" % (var, pre, post))
+        append("%d\nend_operator\n" % op.cost)
+    append("%d\n" % len(task.axioms))
+    for axiom in task.axioms:
+        append("begin_rule\n%d\n" % len(axiom.condition))
+        for var, val in axiom.condition:
+            append("%d %d\n" % (var, val))
+        var, val = axiom.effect
+        append("%d %d %d\nend_rule\n" % (var, 1 - val, val))
+    return "".join(parts)
+
+
 def write_file(state: dict, filename: str):
     """
     Write the problem represented in `state` to disk.
     """
     with open(filename, "w") as file:
-        state[KEY_IN_STATE].output(file)
+        file.write(_fast_output(state[KEY_IN_STATE]))
+
+
+def _short_name(n: int) -> str:
+    """
+    Return the *n*-th name in the sequence a, b, ..., z, aa, ab, ...
+    """
+    name = ""
+    n += 1
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        name = chr(97 + rem) + name
+    return name
 
 
 def renamed_sas(sas_task: SASTask):
@@ -242,17 +479,27 @@ def renamed_sas(sas_task: SASTask):
     Rename all variables, facts and operator in the SAS task. Facts for variable i will be named Ai Bi Ci ..., and operators
     will be named a b c ...
     """
-    new_task = copy.deepcopy(sas_task)
-    # Alphabet
-    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    # Only the value names and operator names change, so we rebuild just
+    # those and share all other parts of the task by reference instead of
+    # deep-copying the whole task.
 
     # Rename variables
-    for i, size in enumerate(new_task.variables.ranges):
-        for j in range(size):
-            new_task.variables.value_names[i][j] = f"{alphabet[j].upper()}{i}"
-
-    # Rename operators
-    for i in range(len(sas_task.operators)):
-        new_task.operators[i].name = f"({alphabet[i]})"
-
+    new_value_names = [[f"{_short_name(j).upper()}{i}" for j in range(size)]
+                       for i, size in enumerate(sas_task.variables.ranges)]
+    new_variables = SASVariables(sas_task.variables.ranges,
+                                 sas_task.variables.axiom_layers,
+                                 new_value_names)
+
+    # Rename operators. Shallow copies share the (unmodified) prevail and
+    # pre_post lists and avoid re-sorting the operators by their new names.
+    op_names = [f"({_short_name(i)})" for i in range(len(sas_task.operators))]
+    new_operators = []
+    for op, name in zip(sas_task.operators, op_names):
+        new_op = copy.copy(op)
+        new_op.name = name
+        new_operators.append(new_op)
+
+    new_task = copy.copy(sas_task)
+    new_task.variables = new_variables
+    new_task.operators = new_operators
     return new_task
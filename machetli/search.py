@@ -1,15 +1,17 @@
+from bisect import insort
+import hashlib
 import logging
-from pathlib import Path, PosixPath
+from pathlib import Path
 
 from machetli.environments import LocalEnvironment, EvaluationTask
 from machetli.errors import SubmissionError, PollingError
 from machetli.successors import SuccessorGenerator, make_single_successor_generator, Successor
-from machetli.tools import batched, configure_logging
+from machetli.tools import configure_logging, prefetched_batches
 from machetli.sas.sas_tasks import SASTask
 from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 
-def search(initial_state: Dict[str, SASTask], successor_generator: List[SuccessorGenerator], evaluator_path: PosixPath, environment: Optional[LocalEnvironment]=None, deterministic: bool=False) -> Dict[str, SASTask]:
+def search(initial_state: Dict[str, SASTask], successor_generator: List[SuccessorGenerator], evaluator_path: Path, environment: Optional[LocalEnvironment]=None, deterministic: bool=False, speculative_initial_check: bool=False) -> Dict[str, SASTask]:
     """Start a Machetli search and return the resulting state.
 
     The search is started from the *initial state* and *successor generators*
@@ -57,6 +59,16 @@ def search(initial_state: Dict[str, SASTask], successor_generator: List[Successo
         force a deterministic order. The search then simulates sequential
         execution.
 
+    :param speculative_initial_check:
+        By default, the search evaluates the initial state on its own and
+        only starts evaluating successors afterwards. If this option is set,
+        the initial state is instead submitted together with the first batch
+        of successors, so environments that evaluate in parallel save one
+        full evaluator round trip at the start of the search. The successors
+        of the first batch are then evaluated speculatively: if the initial
+        state turns out not to have the property, their results are
+        discarded and the search aborts as usual.
+
     :return: the last state where the evaluator was successful, i.e., all
         successors of the resulting state no longer have the evaluated property.
 
@@ -95,28 +107,17 @@ def search(initial_state: Dict[str, SASTask], successor_generator: List[Successo
     if environment is None:
         environment = LocalEnvironment()
     configure_logging(environment.loglevel)
+    evaluator_path = Path(evaluator_path)
 
-    # Verify that initial state has property
-    environment.start_new_iteration()
-    tasks = environment.run(evaluator_path, [Successor(initial_state, "Initial state")], lambda _: None)
-    for task in tasks:
-        if task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
-            logging.info("Initial has property.")
-        elif task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
-            logging.critical("Initial state does not have property!")
-            raise ValueError("Initial state does not have the evaluated property.")
-        elif task.status == EvaluationTask.OUT_OF_RESOURCES:
-            logging.warning("Initial state evaluation ran out of resources! Cannot verify if it has the property.")
-            if deterministic:
-                raise ValueError("Initial state evaluation ran out of resources! Cannot verify if it has the evaluated property.")
-        elif task.status == EvaluationTask.CRITICAL:
-            logging.critical( "Initial state evaluation failed with a critical error! Cannot verify if it has the property.")
-            if deterministic:
-                raise ValueError("Initial state evaluation failed with a critical error! Cannot verify if it has the evaluated property.")
-        elif task.status == EvaluationTask.CANCELED:
-            logging.warning("Initial state evaluation was canceled. Cannot verify if it has the property.")
-        else:
-            raise ValueError(f"Unexpected task status: '{task.status}'.")
+    initial_check = Successor(initial_state, "Initial state")
+    if not speculative_initial_check:
+        # Verify that initial state has property
+        environment.start_new_iteration()
+        tasks = environment.run(evaluator_path, [initial_check],
+                                lambda _: None)
+        for task in tasks:
+            _handle_initial_check_result(task, deterministic)
+        initial_check = None
 
     successor_generator = make_single_successor_generator(successor_generator)
 
@@ -127,7 +128,9 @@ def search(initial_state: Dict[str, SASTask], successor_generator: List[Successo
         successors = successor_generator.get_successors(current_state)
         try:
             improving_state, message = _get_improving_successor(
-                Path(evaluator_path), successors, environment, deterministic)
+                evaluator_path, successors, environment, deterministic,
+                initial_check)
+            initial_check = None
         except SubmissionError as e:
             logging.critical(f"Terminating search because job submission for successor evaluation failed:\n{e}")
         except PollingError as e:
@@ -135,17 +138,106 @@ def search(initial_state: Dict[str, SASTask], successor_generator: List[Successo
 
         if message:
             logging.info(message)
+        environment.record_iteration_result(improving_state is not None)
         if improving_state:
             current_state = improving_state
         else:
             return current_state
 
 
-def _get_improving_successor(evaluator_path: PosixPath, successors: Iterator[Any], environment: LocalEnvironment, deterministic: bool) -> Union[Tuple[None, str], Tuple[Dict[str, SASTask], str]]:
-    tasks_out_of_resources = set()
-    for batch in batched(successors, environment.batch_size):
+def _handle_initial_check_result(task: EvaluationTask, deterministic: bool):
+    if task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+        logging.info("Initial has property.")
+    elif task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
+        logging.critical("Initial state does not have property!")
+        raise ValueError("Initial state does not have the evaluated property.")
+    elif task.status == EvaluationTask.OUT_OF_RESOURCES:
+        logging.warning("Initial state evaluation ran out of resources! Cannot verify if it has the property.")
+        if deterministic:
+            raise ValueError("Initial state evaluation ran out of resources! Cannot verify if it has the evaluated property.")
+    elif task.status == EvaluationTask.CRITICAL:
+        logging.critical( "Initial state evaluation failed with a critical error! Cannot verify if it has the property.")
+        if deterministic:
+            raise ValueError("Initial state evaluation failed with a critical error! Cannot verify if it has the evaluated property.")
+    elif task.status == EvaluationTask.CANCELED:
+        logging.warning("Initial state evaluation was canceled. Cannot verify if it has the property.")
+    else:
+        raise ValueError(f"Unexpected task status: '{task.status}'.")
+
+
+def _fingerprint(successor: Successor) -> Optional[bytes]:
+    """
+    Compute a stable fingerprint of the successor's state so that
+    structurally identical states can be recognized. Returns None if the
+    state cannot be serialized (caching is then skipped for it).
+    """
+    try:
+        blob = successor.blob
+    except Exception:
+        return None
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+def _get_improving_successor(evaluator_path: Path, successors: Iterator[Any], environment: LocalEnvironment, deterministic: bool, initial_check: Optional[Successor]=None) -> Union[Tuple[None, str], Tuple[Dict[str, SASTask], str]]:
+    # Only the run directories are needed for the final message. Keeping
+    # the tasks themselves would pin their successor states (and thus the
+    # full planning tasks) in memory until the end of the search.
+    out_of_resource_run_dirs = []
+    # Batches are prepared on a background thread so successor generation
+    # overlaps with the evaluation of the previous batch.
+    for full_batch in prefetched_batches(successors,
+                                         environment.get_batch_size()):
+        # Duplicate states are common when several successor generators
+        # overlap. Successors whose state was already evaluated short-circuit
+        # to the cached result instead of running the evaluator again.
+        cached_present = None
+        batch = []
+        fingerprints = []
+        seen_fingerprints = set()
+        for successor in full_batch:
+            fingerprint = _fingerprint(successor)
+            if fingerprint in seen_fingerprints:
+                # Different successor generators can emit the same state
+                # within one batch; evaluating it once is enough.
+                continue
+            status = environment.get_cached_status(fingerprint)
+            if status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
+                continue
+            elif status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+                if not deterministic and initial_check is None:
+                    return successor.state, successor.change_msg
+                # In deterministic mode, the earlier successors have to be
+                # evaluated first; fall back to the cached result only if
+                # none of them takes precedence. With a pending initial-state
+                # check, the batch still has to run to carry that check.
+                cached_present = successor
+                break
+            batch.append(successor)
+            fingerprints.append(fingerprint)
+            if fingerprint is not None:
+                seen_fingerprints.add(fingerprint)
+        verify_task_id = None
+        if initial_check is not None:
+            # Speculative initial-state check: the initial state is
+            # submitted in front of the first batch so its evaluation and
+            # the first successor evaluations share one round trip.
+            batch.insert(0, initial_check)
+            fingerprints.insert(0, _fingerprint(initial_check))
+            verify_task_id = 0
+            initial_check = None
+        if not batch:
+            if cached_present is not None:
+                return cached_present.state, cached_present.change_msg
+            continue
         task_ids = list(range(len(batch)))
         def on_task_completed(task):
+            if verify_task_id is not None and task.successor_id == verify_task_id:
+                if task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
+                    # The initial state lacks the property, so the search
+                    # will abort and all speculative evaluations can be
+                    # canceled.
+                    return [i for i in task_ids if i != verify_task_id]
+                return None
             if (deterministic and task.status !=
                     EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT):
                 # Either we have an improving successor, or there was an error.
@@ -154,17 +246,40 @@ def _get_improving_successor(evaluator_path: PosixPath, successors: Iterator[Any
             elif (not deterministic and task.status ==
                   EvaluationTask.DONE_AND_BEHAVIOR_PRESENT):
                 # We found an improving successor, so all other evaluations can
-                # be canceled.
-                task_ids_to_cancel = task_ids
+                # be canceled. The initial-state check is exempt: its verdict
+                # is still needed before the successor can be accepted.
+                task_ids_to_cancel = [i for i in task_ids
+                                      if i != verify_task_id]
             else:
                 task_ids_to_cancel = None
             return task_ids_to_cancel
 
-        tasks = environment.run(evaluator_path, batch, on_task_completed)
-        for task in tasks:
+        result_tasks = environment.run(evaluator_path, batch, on_task_completed)
+        if deterministic:
+            # Sequential semantics require inspecting the results in
+            # submission order, so the batch is drained before the loop.
+            result_tasks = sorted(result_tasks, key=lambda t: t.successor_id)
+        improving = None
+        for task in result_tasks:
+            if verify_task_id is not None and task.successor_id == verify_task_id:
+                _handle_initial_check_result(task, deterministic)
+                verify_task_id = None
+                if improving is not None:
+                    return improving
+                continue
+            environment.cache_status(fingerprints[task.successor_id],
+                                     task.status)
             if task.status == EvaluationTask.DONE_AND_BEHAVIOR_NOT_PRESENT:
                 continue
             elif task.status == EvaluationTask.DONE_AND_BEHAVIOR_PRESENT:
+                if verify_task_id is not None:
+                    # The initial-state verdict is still pending, so keep
+                    # consuming results until it arrives before committing
+                    # to this successor.
+                    if improving is None:
+                        improving = (task.successor.state,
+                                     task.successor.change_msg)
+                    continue
                 return task.successor.state, task.successor.change_msg
             elif task.status == EvaluationTask.OUT_OF_RESOURCES:
                 if deterministic:
@@ -173,7 +288,9 @@ def _get_improving_successor(evaluator_path: PosixPath, successors: Iterator[Any
                         "'deterministic' an improving successor found later "
                         "would not count.")
                 else:
-                    tasks_out_of_resources.add(task)
+                    # Insert in sorted order; the final message then only
+                    # walks the list instead of sorting it.
+                    insort(out_of_resource_run_dirs, str(task.run_dir))
             elif task.status == EvaluationTask.CRITICAL:
                 if deterministic:
                     return None, (task.error_msg +
@@ -188,11 +305,20 @@ def _get_improving_successor(evaluator_path: PosixPath, successors: Iterator[Any
                 assert not deterministic
             else:
                 assert False, f"Unexpected task status: '{task.status}'."
+        if cached_present is not None:
+            return cached_present.state, cached_present.change_msg
+
+    if initial_check is not None:
+        # The successor generator produced no batches, so there was nothing
+        # to piggyback the speculative check on; evaluate the initial state
+        # on its own like the non-speculative path does.
+        for task in environment.run(evaluator_path, [initial_check],
+                                    lambda _: None):
+            _handle_initial_check_result(task, deterministic)
 
     message = "No improving successor was found."
-    if tasks_out_of_resources:
-        run_dirs = [task.run_dir for task in tasks_out_of_resources]
-        run_dirs_str = "\n".join(str(s) for s in sorted(run_dirs))
+    if out_of_resource_run_dirs:
+        run_dirs_str = "\n".join(out_of_resource_run_dirs)
         message += (
             f" Note that the following tasks ran out of resources and thus"
             f" could not successfully be checked:\n{run_dirs_str}")
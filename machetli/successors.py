@@ -13,6 +13,8 @@ generators for PDDL and SAS :sup:`+` files are implemented in the packages
 import random
 from typing import Dict, List
 
+from machetli import tools
+
 RNG = random.Random(2024)
 """
 Random number generator used for shuffling the order of successors in successor
@@ -22,9 +24,24 @@ reproducible.
 
 
 class Successor:
+    __slots__ = ("state", "change_msg", "_blob")
+
     def __init__(self, state: Dict[str, 'SASTask'], msg: str):
         self.state = state
         self.change_msg = msg
+        self._blob = None
+
+    @property
+    def blob(self) -> bytes:
+        """
+        Serialized representation of the state, computed on first access
+        and cached. All consumers of the serialized state (writing it to
+        the run directory, fingerprinting it for the evaluation cache) use
+        this blob, so the state is serialized at most once per successor.
+        """
+        if self._blob is None:
+            self._blob = tools.serialize_state(self.state)
+        return self._blob
 
 
 class SuccessorGenerator:
@@ -34,6 +51,13 @@ class SuccessorGenerator:
     def get_successors(self, state):
         """
         Yield successors of *state*.
+
+        Implementations should be generators that create each successor
+        on demand rather than returning a full list: the search usually
+        commits to one of the first successors, and successors that are
+        never pulled are then never materialized. When the search stops
+        consuming successors early, the generator is closed, so cleanup
+        code in a ``finally`` block runs immediately.
         """
         raise NotImplementedError
 
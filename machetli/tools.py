@@ -8,11 +8,18 @@ import itertools
 import logging
 from pathlib import Path
 import pickle
+import queue
 import re
 import resource
 import shutil
 import subprocess
 import sys
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 DEFAULT_ENCODING = "utf-8"
 
@@ -36,6 +43,65 @@ def batched(iterable, n):
         yield batch
 
 
+_END_OF_BATCHES = object()
+
+
+class _ProducerError:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def prefetched_batches(iterable, n, prefetch=2):
+    """
+    Like :func:`batched`, but the batches are produced on a background
+    thread while the consumer processes earlier ones. This overlaps the
+    cost of generating successors with their evaluation. At most *prefetch*
+    batches are buffered, so memory use stays bounded. When the consumer
+    stops iterating early, the producer thread stops pulling from
+    *iterable* instead of draining it.
+    """
+    batch_queue = queue.Queue(maxsize=prefetch)
+    cancel = threading.Event()
+
+    def produce():
+        try:
+            for batch in batched(iterable, n):
+                batch_queue.put(batch)
+                if cancel.is_set():
+                    return
+            batch_queue.put(_END_OF_BATCHES)
+        except BaseException as e:
+            batch_queue.put(_ProducerError(e))
+        finally:
+            # Close generator-valued iterables so cancellation propagates:
+            # a GeneratorExit is raised at their suspension point, which
+            # also closes generators they delegate to. Closing here (on
+            # the producer thread) is safe because the iterable is no
+            # longer being advanced.
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = batch_queue.get()
+            if item is _END_OF_BATCHES:
+                return
+            if isinstance(item, _ProducerError):
+                raise item.exception
+            yield item
+    finally:
+        cancel.set()
+        # Free one queue slot in case the producer is blocked in put(), so
+        # it can notice the cancellation and terminate.
+        try:
+            batch_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+
 def get_script_path():
     """
     Get absolute path to main script, or the current working directory, if the
@@ -98,20 +164,85 @@ def configure_logging(level=logging.INFO):
     root_logger.setLevel(level)
 
 
+MSGPACK_STATE_MAGIC = b"machetli-msgpack\n"
+"""
+Header written in front of msgpack-serialized states so
+:func:`read_state` can distinguish them from pickled states.
+"""
+
+_MSGPACK_ENCODERS = {}
+_MSGPACK_DECODERS = {}
+
+
+def register_msgpack_type(tag, cls, encode, decode):
+    """
+    Register a type for msgpack state serialization. *encode* converts an
+    instance of *cls* into msgpack-serializable data (nested lists, dicts,
+    ints, strings), *decode* reconstructs an instance from that data.
+    States containing only registered types and plain data are stored as
+    msgpack, which is faster to deserialize than pickle; everything else
+    falls back to pickle.
+    """
+    _MSGPACK_ENCODERS[cls] = (tag, encode)
+    _MSGPACK_DECODERS[tag] = decode
+
+
+def _msgpack_default(obj):
+    try:
+        tag, encode = _MSGPACK_ENCODERS[type(obj)]
+    except KeyError:
+        raise TypeError(
+            f"No msgpack encoder registered for {type(obj)}.") from None
+    return {"__machetli__": tag, "data": encode(obj)}
+
+
+def _msgpack_object_hook(obj):
+    tag = obj.get("__machetli__")
+    if tag is not None:
+        return _MSGPACK_DECODERS[tag](obj["data"])
+    return obj
+
+
+def serialize_state(state):
+    """
+    Serialize a given state to the bytes that :func:`write_state` stores on
+    disk. States made up of plain data and types registered with
+    :func:`register_msgpack_type` are stored as msgpack if the `msgpack`
+    package is installed; all other states are pickled.
+    """
+    if msgpack is not None:
+        try:
+            packed = msgpack.packb(state, default=_msgpack_default)
+        except TypeError:
+            pass
+        else:
+            return MSGPACK_STATE_MAGIC + packed
+    return pickle.dumps(state)
+
+
 def write_state(state, file_path):
     """
-    Use pickle to write a given state to disk.
+    Write a given state to disk (see :func:`serialize_state` for the
+    format).
     """
     with open(file_path, "wb") as state_file:
-        pickle.dump(state, state_file)
+        state_file.write(serialize_state(state))
 
 
 def read_state(file_path):
     """
-    Use pickle to read a state from disk.
+    Read a state written by :func:`write_state` from disk.
     """
     with open(file_path, "rb") as state_file:
-        return pickle.load(state_file)
+        data = state_file.read()
+    if data.startswith(MSGPACK_STATE_MAGIC):
+        if msgpack is None:
+            raise pickle.UnpicklingError(
+                "State was written as msgpack but the `msgpack` package is "
+                "not installed.")
+        return msgpack.unpackb(data[len(MSGPACK_STATE_MAGIC):],
+                               object_hook=_msgpack_object_hook)
+    return pickle.loads(data)
 
 
 def parse(content, pattern, type=int):
@@ -1,7 +1,39 @@
 from argparse import ArgumentParser
 from pathlib import Path
 
-from machetli.sas.files import _read_task, renamed_sas
+from machetli.sas.files import _short_name
+
+
+def _renamed_lines(lines):
+    """
+    Stream over the lines of a SAS file, replacing fact names with Ai Bi
+    Ci ... (for variable i) and operator names with a b c ... All names
+    are positional in the SAS format, so one pass suffices and no task
+    representation is built in memory.
+    """
+    it = iter(lines)
+    var_index = 0
+    op_index = 0
+    for line in it:
+        if not line.rstrip("\n"):
+            # Skip blank lines (e.g. at the end of the file), like the
+            # parser-based pipeline did.
+            continue
+        yield line
+        if line.rstrip("\n") == "begin_variable":
+            yield next(it)  # variable name
+            yield next(it)  # axiom layer
+            range_line = next(it)
+            yield range_line
+            for j in range(int(range_line)):
+                next(it)  # original value name
+                yield f"{_short_name(j).upper()}{var_index}\n"
+            var_index += 1
+        elif line.rstrip("\n") == "begin_operator":
+            next(it)  # original operator name
+            yield f"{_short_name(op_index)}\n"
+            op_index += 1
+
 
 parser = ArgumentParser("Rename SAS file")
 parser.add_argument("sas_file", type=Path)
@@ -9,7 +41,7 @@ parser.add_argument("-o", dest="new_sas_file", type=Path, default=None)
 args = parser.parse_args()
 
 sas_file_path: Path = args.sas_file
-renamed_sas(_read_task(sas_file_path)).output((args.new_sas_file if args.new_sas_file else (sas_file_path.parent / (sas_file_path.stem + "renamed.sas"))).open("w"))
-
-
-
+new_sas_file_path: Path = (args.new_sas_file if args.new_sas_file
+                           else sas_file_path.parent / (sas_file_path.stem + "renamed.sas"))
+with sas_file_path.open() as fin, new_sas_file_path.open("w") as fout:
+    fout.writelines(_renamed_lines(fin))